@@ -3,11 +3,15 @@ from dataclasses import dataclass
 
 @dataclass
 class ReplayFrame:
+    __slots__ = ("delta",)
+
     delta: int
 
 
 @dataclass
 class OsuReplayFrame(ReplayFrame):
+    __slots__ = ("x", "y", "keys")
+
     x: int
     y: int
     keys: int
@@ -15,16 +19,22 @@ class OsuReplayFrame(ReplayFrame):
 
 @dataclass
 class TaikoReplayFrame(ReplayFrame):
+    __slots__ = ("x", "keys")
+
     x: int
     keys: int
 
 
 @dataclass
 class CatchReplayFrame(ReplayFrame):
+    __slots__ = ("x", "dashing")
+
     x: int
     dashing: bool
 
 
 @dataclass
 class ManiaReplayFrame(ReplayFrame):
+    __slots__ = ("keys",)
+
     keys: int
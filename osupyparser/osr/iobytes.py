@@ -1,5 +1,45 @@
 import struct
 
+# Precompiled little-endian primitives, so the format string
+# isn't reparsed on every read.
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_I16 = struct.Struct("<h")
+_U32 = struct.Struct("<I")
+_I32 = struct.Struct("<i")
+_U64 = struct.Struct("<Q")
+_I64 = struct.Struct("<q")
+_F32 = struct.Struct("<f")
+_F64 = struct.Struct("<d")
+
+
+def _read_uleb128(buf: bytes, off: int) -> tuple:
+    """Reads a uleb bytes into int, returns it with new offset."""
+    if buf[off] != 0x0b:
+        return 0, off + 1
+
+    # Hashes and names fit in a single length byte, skip the loop then.
+    val = buf[off+1]
+    off += 2
+    if val >= 0b10000000:
+        val &= 0b01111111
+        shift = 7
+        while True:
+            b = buf[off]
+            off += 1
+            val |= (b & 0b01111111) << shift
+            if b < 0b10000000:
+                break
+            shift += 7
+    return val, off
+
+
+def _read_string(buf: bytes, off: int) -> tuple:
+    """Reads uleb128 prefixed string, returns it with new offset."""
+    s_len, off = _read_uleb128(buf, off)
+    # str() decodes a memoryview slice without copying it to bytes first.
+    return str(buf[off:off+s_len], "utf-8"), off + s_len
+
 
 class BinaryRotator:
     """A class for bytes readizng."""
@@ -15,56 +55,57 @@ class BinaryRotator:
         self.offset += offset
         return data
 
-    def read_int(self, size: int, signed: bool) -> int:
-        """Read a int."""
-        return int.from_bytes(
-            self.read(size),
-            "little",
-            signed=signed
-        )
-
     def read_u8(self) -> int:
-        return self.read_int(1, False)
+        v, = _U8.unpack_from(self.buffer, self.offset)
+        self.offset += 1
+        return v
 
     def read_u16(self) -> int:
-        return self.read_int(2, False)
+        v, = _U16.unpack_from(self.buffer, self.offset)
+        self.offset += 2
+        return v
 
     def read_i16(self) -> int:
-        return self.read_int(2, True)
+        v, = _I16.unpack_from(self.buffer, self.offset)
+        self.offset += 2
+        return v
 
     def read_u32(self) -> int:
-        return self.read_int(4, False)
+        v, = _U32.unpack_from(self.buffer, self.offset)
+        self.offset += 4
+        return v
 
     def read_i32(self) -> int:
-        return self.read_int(4, True)
+        v, = _I32.unpack_from(self.buffer, self.offset)
+        self.offset += 4
+        return v
 
     def read_u64(self) -> int:
-        return self.read_int(8, False)
+        v, = _U64.unpack_from(self.buffer, self.offset)
+        self.offset += 8
+        return v
 
     def read_i64(self) -> int:
-        return self.read_int(8, True)
+        v, = _I64.unpack_from(self.buffer, self.offset)
+        self.offset += 8
+        return v
 
     def read_f32(self) -> float:
-        return struct.unpack("<f", self.read(4))
+        v, = _F32.unpack_from(self.buffer, self.offset)
+        self.offset += 4
+        return v
 
     def read_f64(self) -> float:
-        return struct.unpack("<f", self.read(8))
+        v, = _F64.unpack_from(self.buffer, self.offset)
+        self.offset += 8
+        return v
 
     def read_uleb128(self) -> int:
         """Reads a uleb bytes into int."""
-        if self.read_u8() != 0x0b:
-            return ""
-
-        val = shift = 0
-        while True:
-            b = self.read_u8()
-            val |= (b & 0b01111111) << shift
-            if (b & 0b10000000) == 0:
-                break
-            shift += 7
+        val, self.offset = _read_uleb128(self.buffer, self.offset)
         return val
 
     def read_string(self) -> str:
         """Read string."""
-        s_len = self.read_uleb128()
-        return self.read(s_len).decode()
+        s, self.offset = _read_string(self.buffer, self.offset)
+        return s
@@ -1,115 +1,189 @@
+import os
 import lzma
-import datetime
-import functools
-from dataclasses import dataclass
+import mmap
 import struct
-
-
-class BinaryRotator:
-    """A class for bytes readizng."""
-
-    def __init__(self, data: bytes) -> None:
-        self.buffer: bytes = data
-        self.offset: int = 0
-
-    def read(self, offset: int) -> bytes:
-        """Reads offseted data."""
-
-        data = self.buffer[self.offset:self.offset+offset]
-        self.offset += offset
-        return data
-
-    def read_int(self, size: int, signed: bool) -> int:
-        """Read a int."""
-        return int.from_bytes(
-            self.read(size),
-            "little",
-            signed=signed
-        )
-
-    def read_u8(self) -> int:
-        return self.read_int(1, False)
-
-    def read_u16(self) -> int:
-        return self.read_int(2, False)
-
-    def read_i16(self) -> int:
-        return self.read_int(2, True)
-
-    def read_u32(self) -> int:
-        return self.read_int(4, False)
-
-    def read_i32(self) -> int:
-        return self.read_int(4, True)
-
-    def read_u64(self) -> int:
-        return self.read_int(8, False)
-
-    def read_i64(self) -> int:
-        return self.read_int(8, True)
-
-    def read_f32(self) -> float:
-        return struct.unpack("<f", self.read(4))
-
-    def read_f64(self) -> float:
-        return struct.unpack("<f", self.read(8))
-
-    def read_uleb128(self) -> int:
-        """Reads a uleb bytes into int."""
-        if self.read_u8() != 0x0b:
-            return ""
-
-        val = shift = 0
-        while True:
-            b = self.read_u8()
-            val |= (b & 0b01111111) << shift
-            if (b & 0b10000000) == 0:
-                break
-            shift += 7
-        return val
-
-    def read_string(self) -> str:
-        """Read string."""
-        s_len = self.read_uleb128()
-        return self.read(s_len).decode()
-
-
-@dataclass
-class ReplayFrame:
-    delta: int
-
-
-@dataclass
-class OsuReplayFrame(ReplayFrame):
-    x: int
-    y: int
-    keys: int
-
-
-@dataclass
-class TaikoReplayFrame(ReplayFrame):
-    x: int
-    keys: int
-
-
-@dataclass
-class CatchReplayFrame(ReplayFrame):
-    x: int
-    dashing: bool
-
-
-@dataclass
-class ManiaReplayFrame(ReplayFrame):
-    keys: int
-
-
+import datetime
+from array import array
+from operator import eq
+from itertools import repeat
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+from .constants import OsuReplayFrame
+from .constants import TaikoReplayFrame
+from .constants import CatchReplayFrame
+from .constants import ManiaReplayFrame
+from .iobytes import BinaryRotator
+from .iobytes import _I64
+from .iobytes import _read_string
+
+# Short mod names in bit order, used to build mods string.
+_MOD_TABLE = (
+    ("NF", 1),
+    ("EZ", 2),
+    ("HD", 8),
+    ("HR", 16),
+    ("SD", 32),
+    ("DT", 64),
+    ("RX", 128),
+    ("HT", 256),
+    ("NC", 512),
+    ("FL", 1024),
+    ("AP", 2048),
+    ("SO", 4096),
+    ("PF", 16384),
+)
+
+# Fixed width runs of the replay header, between its strings.
+# mode, osu_version
+_HEADER_PREFIX = struct.Struct("<Bi")
+# n300, n100, n50, ngeki, nkatu, nmiss, score, max_combo, perfect, mods
+_HEADER_STATS = struct.Struct("<HHHHHHiHBi")
+
+# Every byte except frame separators, deleted to check frame layout.
+_NOT_SEPARATOR = bytes(b for b in range(256) if b not in b"|,")
+
+# Size of compressed slices fed to the lzma decompressor.
+_LZMA_CHUNK = 1 << 16
+
+
+class ReplayFrames(Sequence):
+    """Lazy view over replay columns, frames are created on access."""
+
+    __slots__ = ("mode", "delta", "x", "y", "keys", "dashing", "_make")
+
+    def __init__(self, mode: int, delta: array, x: array, y: array,
+                 keys: array, dashing: array) -> None:
+        self.mode = mode
+        self.delta = delta
+        self.x = x
+        self.y = y
+        self.keys = keys
+        self.dashing = dashing
+        # Pick the frame builder once, so indexing doesn't branch on mode.
+        self._make = (self._osu, self._taiko, self._catch, self._mania)[mode]
+
+    def _osu(self, i: int) -> OsuReplayFrame:
+        return OsuReplayFrame(self.delta[i], self.x[i], self.y[i],
+                              self.keys[i])
+
+    def _taiko(self, i: int) -> TaikoReplayFrame:
+        return TaikoReplayFrame(self.delta[i], self.x[i], self.keys[i])
+
+    def _catch(self, i: int) -> CatchReplayFrame:
+        return CatchReplayFrame(self.delta[i], self.x[i],
+                                self.dashing[i] == 1)
+
+    def _mania(self, i: int) -> ManiaReplayFrame:
+        return ManiaReplayFrame(self.delta[i], self.keys[i])
+
+    def __len__(self) -> int:
+        return len(self.delta)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(self._make, range(*index.indices(len(self)))))
+        return self._make(index)
+
+    def __iter__(self):
+        return map(self._make, range(len(self)))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ReplayFrames):
+            return (self.mode == other.mode and self.delta == other.delta
+                    and self.x == other.x and self.y == other.y
+                    and self.keys == other.keys
+                    and self.dashing == other.dashing)
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(map(eq, self, other))
+
+    def __reduce__(self):
+        return (ReplayFrames, (self.mode, self.delta, self.x, self.y,
+                               self.keys, self.dashing))
+
+    def __repr__(self) -> str:
+        return f"<ReplayFrames mode={self.mode} len={len(self)}>"
+
+
+def _decompress(data: memoryview) -> bytearray:
+    """Decompresses lzma data chunk by chunk."""
+    dec = lzma.LZMADecompressor(format=lzma.FORMAT_AUTO)
+    # Frames compress well, so guess the output size up front
+    # instead of letting the buffer grow in small steps.
+    out = bytearray(len(data) * 8)
+    pos = 0
+    for i in range(0, len(data), _LZMA_CHUNK):
+        if dec.eof:
+            break
+
+        # Release each slice even on error, so a mapped file can be closed.
+        with data[i:i+_LZMA_CHUNK] as chunk:
+            pending = chunk
+            while True:
+                if pos == len(out):
+                    out += bytes(len(out))
+
+                block = dec.decompress(pending, max_length=len(out) - pos)
+                out[pos:pos+len(block)] = block
+                pos += len(block)
+                if dec.needs_input or dec.eof:
+                    break
+                pending = b""
+
+    if not dec.eof:
+        raise lzma.LZMAError("Compressed data ended before the "
+                             "end-of-stream marker was reached")
+    del out[pos:]
+    return out
+
+
+def _parse_header(buf: memoryview, off: int) -> tuple:
+    """Parses replay header, returns all fields with offset past them."""
+    mode, osu_version = _HEADER_PREFIX.unpack_from(buf, off)
+    off += _HEADER_PREFIX.size
+    map_md5, off = _read_string(buf, off)
+    player_name, off = _read_string(buf, off)
+    replay_md5, off = _read_string(buf, off)
+    (
+        n300, n100, n50, ngeki, nkatu, nmiss,
+        score, max_combo, perfect, mods,
+    ) = _HEADER_STATS.unpack_from(buf, off)
+    off += _HEADER_STATS.size
+    life_graph, off = _read_string(buf, off)
+    ticks, = _I64.unpack_from(buf, off)
+    off += 8
+
+    return (
+        mode, osu_version, map_md5, player_name, replay_md5,
+        n300, n100, n50, ngeki, nkatu, nmiss, score, max_combo,
+        perfect == 1, mods, life_graph, ticks, off,
+    )
+
+
+def _parse_one(cls, file_path: str, pure_lzma: bool):
+    """Fully parses a single replay, used by ReplayFile.from_files."""
+    replay = cls.from_file(file_path, pure_lzma)
+    if replay._delta is None:
+        # Read frames here, the reader can't be sent back to parent.
+        replay.read_lzma()
+    return replay
 
 
 class ReplayFile:
     """A class representing replay file data."""
 
+    __slots__ = (
+        "_reader", "mode", "osu_version", "map_md5", "player_name",
+        "replay_md5", "n300", "n100", "n50", "ngeki", "nkatu", "nmiss",
+        "score", "max_combo", "perfect", "mods", "life_graph", "_ticks",
+        "_delta", "_x", "_y", "_keys", "_dashing", "_frames", "_score_id",
+        "_seed", "_target_practice_hits", "_mods_str", "_accuracy",
+        "_timestamp",
+    )
+
     def __init__(self) -> None:
-        self.__reader = None
+        self._reader: BinaryRotator = None
 
         self.mode: int = 0
         self.osu_version: int = 0
@@ -127,21 +201,28 @@ class ReplayFile:
         self.perfect: bool = False
         self.mods: int = 0
         self.life_graph: str = ""
-        self.timestamp: datetime.datetime = 0
-        self._frames: list = None
+        self._ticks: int = 0
+        self._delta: array = None
+        self._x: array = None
+        self._y: array = None
+        self._keys: array = None
+        self._dashing: array = None
+        self._frames: ReplayFrames = None
         self._score_id: int = None
         self._seed: int = None
-        self._accuracy: float = None
         self._target_practice_hits: float = None
+        # Slots leave no __dict__ for cached_property, cache values here.
+        self._mods_str: str = None
+        self._accuracy: float = None
+        self._timestamp: datetime.datetime = None
 
     @classmethod
     def from_bytes(cls, bytedata: bytes, pure_lzma: bool = False):
         """Parses replay from bytes data."""
-        cls.__init__(cls)  # new_instance = cls()
+        new_instance = cls()
 
-        cls.__reader = BinaryRotator(bytedata)  # new_instance.__reader = ...
-        # new_instance.parse_data(pure_lzma)
-        return cls.parse_data(cls, pure_lzma)
+        new_instance._reader = BinaryRotator(bytedata)
+        return new_instance.parse_data(pure_lzma)
 
     @classmethod
     def from_file(cls, file_path: str, pure_lzma: bool = False):
@@ -149,30 +230,44 @@ class ReplayFile:
         new_instance = cls()
 
         with open(file_path, "rb") as stream:
-            new_instance.__reader = BinaryRotator(stream.read())
-        return new_instance.parse_data(pure_lzma)
+            # Frames are read lazily, the data has to outlive the file.
+            # Empty files can't be mapped, let lzma report them instead.
+            if not pure_lzma or not os.fstat(stream.fileno()).st_size:
+                new_instance._reader = BinaryRotator(stream.read())
+                return new_instance.parse_data(pure_lzma)
+
+            # Pure lzma is decoded at once, straight from the mapped file.
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            new_instance._reader = BinaryRotator(mapped)
+            new_instance.parse_data(pure_lzma)
+        finally:
+            new_instance._reader = None
+            mapped.close()
+        return new_instance
+
+    @classmethod
+    def from_files(cls, file_paths: list, pure_lzma: bool = False,
+                   workers: int = None) -> list:
+        """Parses many replays at once in a pool of processes."""
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_parse_one, repeat(cls), file_paths,
+                                     repeat(pure_lzma), chunksize=8))
 
     def __hash__(self):
         return hash(self.replay_md5)
 
     def parse_lzma(self) -> None:
         """Parses only lzma data from replay."""
-        data = lzma.decompress(self.__reader.buffer,
-                               format=lzma.FORMAT_AUTO).decode("ascii")
-        frames = [frame.split("|") for frame in data.split(",")[:-1]]
-
-        for action in frames:
-            if self.osu_version >= 20130319 and action[0] == "-12345":
-                # After 20130319 replays started to have seeds.
-                self.seed = int(action[3])
-                continue
-
-            # We dont know what mode is it so we assume its standard.
-            frame = OsuReplayFrame(int(action[0]), float(
-                action[1]), float(action[2]), int(action[3]))
-            self.frames.append(frame)
-
-    def parse_osu_mods(self):
+        # We dont know what mode is it so we assume its standard.
+        with memoryview(self._reader.buffer) as buf:
+            data = _decompress(buf)
+        self._parse_frames(data)
+        self._reader = None
+
+    @property
+    def mods_str(self) -> str:
         """
         None 	0 	
         NoFail 	1 (0) 	
@@ -208,24 +303,15 @@ class ReplayFile:
         ScoreV2 	536870912 (29) 	
         Mirror 	1073741824 (30) 	
         """
-        MODS = {
-            "HD": 8,
-            "HR": 16,
-            "DT": 64,
-            "EZ": 2,
-            "HT": 256,
-            "NC": 512,
-            "NF": 1,
-            "SD": 32,
-            "PF": 16384,
-            "FL": 1024,
-            "RX": 128,
-            "AP": 2048,
-            "SO": 4096,
-        }
-
-        return functools.reduce(
-            lambda acc, val: f"{acc} {val[0]}" if self.mods & val[1] else acc, MODS.items(), "")
+        if self._mods_str is None:
+            mods = self.mods
+            self._mods_str = " ".join(
+                name for name, bit in _MOD_TABLE if mods & bit)
+        return self._mods_str
+
+    def parse_osu_mods(self) -> str:
+        """Returns short names of enabled mods."""
+        return self.mods_str
 
     @property
     def accuracy(self):
@@ -236,65 +322,132 @@ class ReplayFile:
             self._accuracy = weighted_value/all_hit_objects*100
         return self._accuracy
 
+    @property
+    def timestamp(self) -> datetime.datetime:
+        if self._timestamp is None:
+            self._timestamp = self.parse_timestamp(self._ticks)
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, value: datetime.datetime) -> None:
+        self._timestamp = value
+
     @property
     def frames(self):
         if self._frames is None:
-            self.read_lzma()
+            if self._delta is None:
+                self.read_lzma()
+            self._frames = ReplayFrames(self.mode, self._delta, self._x,
+                                        self._y, self._keys, self._dashing)
         return self._frames
 
+    @property
+    def delta(self):
+        if self._delta is None:
+            self.read_lzma()
+        return self._delta
+
+    @property
+    def x(self):
+        if self._delta is None:
+            self.read_lzma()
+        return self._x
+
+    @property
+    def y(self):
+        if self._delta is None:
+            self.read_lzma()
+        return self._y
+
+    @property
+    def keys(self):
+        if self._delta is None:
+            self.read_lzma()
+        return self._keys
+
+    @property
+    def dashing(self):
+        if self._delta is None:
+            self.read_lzma()
+        return self._dashing
+
     @property
     def score_id(self):
-        if self._score_id is None:
+        if self._delta is None:
             self.read_lzma()
         return self._score_id
 
     @property
     def target_practice_hits(self):
-        if self._target_practice_hits is None:
+        if self._delta is None:
             self.read_lzma()
         return self._target_practice_hits
 
     @property
     def seed(self):
-        if self._seed is None:
+        if self._delta is None:
             self.read_lzma()
         return self._seed
 
     def read_lzma(self):
-        lzma_len = self.__reader.read_i32()
-        lzma_data = self.__reader.read(lzma_len)
-        data = lzma.decompress(
-            lzma_data, format=lzma.FORMAT_AUTO).decode("ascii")
-        frames = [frame.split("|") for frame in data.split(",")[:-1]]
-        self._frames = []
-        for action in frames:
-            if self.osu_version >= 20130319 and action[0] == "-12345":
-                # After 20130319 replays started to have seeds.
-                self._seed = int(action[3])
-                continue
-
-            if self.mode == 0:
-                frame = OsuReplayFrame(int(action[0]), float(
-                    action[1]), float(action[2]), int(action[3]))
-            elif self.mode == 1:
-                frame = TaikoReplayFrame(
-                    int(action[0]), float(action[1]), int(action[3]))
-            elif self.mode == 2:
-                frame = CatchReplayFrame(
-                    int(action[0]), float(action[1]), action[3] == "1")
-            elif self.mode == 3:
-                frame = ManiaReplayFrame(int(action[0]), int(action[1]))
-
-            self._frames.append(frame)
+        reader = self._reader
+        lzma_len = reader.read_i32()
+        start = reader.offset
+        reader.offset += lzma_len
+        # A view is held only while decompressing, so the caller's buffer
+        # isn't copied, nor left exported afterwards.
+        with memoryview(reader.buffer) as buf:
+            data = _decompress(buf[start:reader.offset])
+        self._parse_frames(data)
 
         # Reference: https://github.com/ppy/osu/blob/84e1ff79a0736aa6c7a44804b585ab1c54a84399/osu.Game/Scoring/Legacy/LegacyScoreDecoder.cs#L78-L81
         if self.osu_version >= 20140721:
-            self._score_id = self.__reader.read_i64()
+            self._score_id = reader.read_i64()
         elif self.osu_version >= 20121008:
-            self._score_id = self.__reader.read_i32()
+            self._score_id = reader.read_i32()
 
         if self.mods & 8388608:
-            self._target_practice_hits = self.__reader.read_f64()
+            self._target_practice_hits = reader.read_f64()
+
+        # Nothing is left to read, drop the buffer.
+        self._reader = None
+
+    def _parse_frames(self, data: bytearray) -> None:
+        """Parses decompressed frames into replay columns."""
+        # Anything after the last "," is an incomplete frame, drop it.
+        del data[data.rfind(b",") + 1:]
+        # Columns would go out of step on a frame without 4 fields,
+        # so check that separators alone repeat as "|||,".
+        if data.translate(None, _NOT_SEPARATOR) != b"|||," * data.count(b","):
+            raise ValueError("Replay frames must have exactly 4 fields.")
+
+        # Every frame is "w|x|y|z,", so a single split gives a flat list
+        # of fields and each column is just a strided slice of it.
+        # int() and float() take bytes, so the payload is never decoded.
+        fields = bytes(data).replace(b",", b"|").split(b"|")[:-1]
+        deltas = fields[0::4]
+        xs = fields[1::4]
+        ys = fields[2::4]
+        keys = fields[3::4]
+
+        if self.osu_version >= 20130319 and b"-12345" in deltas:
+            # After 20130319 replays started to have seeds.
+            i = deltas.index(b"-12345")
+            self._seed = int(keys[i])
+            del deltas[i], xs[i], ys[i], keys[i]
+
+        # array() sizes itself once when given a list, while from an
+        # iterator it grows one item at a time.
+        self._delta = array("i", list(map(int, deltas)))
+        self._x = array("d", list(map(float, xs)))
+        self._y = array("d", list(map(float, ys)))
+        if self.mode == 3:
+            # Mania stores pressed keys in x.
+            self._keys = array("i", list(map(int, xs)))
+        else:
+            self._keys = array("i", list(map(int, keys)))
+        if self.mode == 2:
+            self._dashing = array("B", list(map((1).__eq__, self._keys)))
 
     def parse_timestamp(self, ticks: int):
         return datetime.datetime(1, 1, 1) + datetime.timedelta(microseconds=ticks // 10)
@@ -302,25 +455,30 @@ class ReplayFile:
     def parse_data(self, only_lzma: bool):
         """Parses all replay data."""
         if only_lzma:
-            self.parse_lzma(self)
+            self.parse_lzma()
             return self
 
-        self.mode = self.__reader.read_u8()
-        self.osu_version = self.__reader.read_i32()
-        self.map_md5 = self.__reader.read_string()
-        self.player_name = self.__reader.read_string()
-        self.replay_md5 = self.__reader.read_string()
-        self.n300 = self.__reader.read_u16()
-        self.n100 = self.__reader.read_u16()
-        self.n50 = self.__reader.read_u16()
-        self.ngeki = self.__reader.read_u16()
-        self.nkatu = self.__reader.read_u16()
-        self.nmiss = self.__reader.read_u16()
-        self.score = self.__reader.read_i32()
-        self.max_combo = self.__reader.read_u16()
-        self.perfect = self.__reader.read_u8() == 1
-        self.mods = self.__reader.read_i32()
-        self.life_graph = self.__reader.read_string()
-        self.timestamp = self.parse_timestamp(self.__reader.read_i64())
+        reader = self._reader
+        with memoryview(reader.buffer) as buf:
+            (
+                self.mode,
+                self.osu_version,
+                self.map_md5,
+                self.player_name,
+                self.replay_md5,
+                self.n300,
+                self.n100,
+                self.n50,
+                self.ngeki,
+                self.nkatu,
+                self.nmiss,
+                self.score,
+                self.max_combo,
+                self.perfect,
+                self.mods,
+                self.life_graph,
+                self._ticks,
+                reader.offset,
+            ) = _parse_header(buf, reader.offset)
 
         return self
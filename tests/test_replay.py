@@ -1,6 +1,41 @@
 from osupyparser import ReplayFile
+from osupyparser import OsuReplayFrame
+from osupyparser import TaikoReplayFrame
+from osupyparser import CatchReplayFrame
+from osupyparser import ManiaReplayFrame
+from osupyparser.osr.iobytes import BinaryRotator
 import unittest
 import time
+import lzma
+import pickle
+import os
+import tempfile
+import datetime
+import struct
+
+FIELDS = (
+    "mode", "osu_version", "map_md5", "player_name", "replay_md5",
+    "n300", "n100", "n50", "ngeki", "nkatu", "nmiss", "score",
+    "max_combo", "perfect", "mods", "mods_str", "accuracy",
+    "life_graph", "timestamp",
+)
+
+
+def build_replay(mode: int, frames: bytes, mods: int = 0,
+                 tail: bytes = b"") -> bytes:
+    """Builds minimal replay bytes around given frames."""
+    def string(s: bytes) -> bytes:
+        return b"\x0b" + bytes([len(s)]) + s
+
+    lzma_data = lzma.compress(frames, format=lzma.FORMAT_ALONE)
+    return (
+        struct.pack("<Bi", mode, 20210809) + string(b"a" * 32)
+        + string(b"player") + string(b"b" * 32)
+        + struct.pack("<HHHHHHiHBi", 1, 0, 0, 0, 0, 0, 300, 1, 1, mods)
+        + string(b"") + struct.pack("<q", 0)
+        + struct.pack("<i", len(lzma_data)) + lzma_data
+        + struct.pack("<q", 1) + tail
+    )
 
 
 class TestReplay(unittest.TestCase):
@@ -8,12 +43,127 @@ class TestReplay(unittest.TestCase):
         start = time.perf_counter()
         data = ReplayFile.from_file("tests//test.osr")
         end = time.perf_counter()
-        self.assertTrue(data.__dict__)
-        info = data.__dict__
-        for d, e in info.items():
-            print(f"{d}: {e}")
+        self.assertTrue(data.replay_md5)
+        for d in FIELDS:
+            print(f"{d}: {getattr(data, d)}")
         print(f"Parsed in {round((end - start) * 1000, 2)}ms")
 
+    def test_frames(self):
+        data = ReplayFile.from_file("tests//test.osr")
+        self.assertEqual(len(data.frames), len(data.delta))
+        self.assertEqual(len(data.x), len(data.keys))
+        self.assertEqual(data.seed, 718104)
+        self.assertEqual(data.frames[2], OsuReplayFrame(-1394, 273.3333, 220.0, 11))
+        self.assertEqual(data.frames[-1], data.frames[len(data.frames) - 1])
+        self.assertIs(data.frames, data.frames)
+        self.assertEqual(data.frames, list(data.frames))
+
+    def test_uleb128(self):
+        reader = BinaryRotator(b"\x0b\x85\x01" + b"a" * 133 + b"\x00")
+        self.assertEqual(reader.read_uleb128(), 133)
+        reader.offset = 136
+        self.assertEqual(reader.read_uleb128(), 0)
+        reader.offset = 0
+        self.assertEqual(reader.read_string(), "a" * 133)
+        self.assertEqual(reader.read_string(), "")
+
+    def test_mods_str(self):
+        data = ReplayFile()
+        data.mods = 8 | 16 | 64 | 512
+        self.assertEqual(data.mods_str, "HD HR DT NC")
+        self.assertEqual(ReplayFile().parse_osu_mods(), "")
+
+    def test_timestamp(self):
+        data = ReplayFile.from_file("tests//test.osr")
+        self.assertEqual(data.timestamp.year, 2021)
+        data.timestamp = datetime.datetime(2022, 1, 1)
+        self.assertEqual(data.timestamp, datetime.datetime(2022, 1, 1))
+
+    def test_modes(self):
+        frames = b"0|3|-500|0,10|5|192|1,-12345|0|0|42,"
+        expected = {
+            1: [TaikoReplayFrame(0, 3.0, 0), TaikoReplayFrame(10, 5.0, 1)],
+            2: [CatchReplayFrame(0, 3.0, False),
+                CatchReplayFrame(10, 5.0, True)],
+            3: [ManiaReplayFrame(0, 3), ManiaReplayFrame(10, 5)],
+        }
+        for mode, mode_frames in expected.items():
+            data = ReplayFile.from_bytes(build_replay(mode, frames))
+            self.assertEqual(data.mode, mode)
+            self.assertEqual(list(data.frames), mode_frames)
+            self.assertEqual(data.seed, 42)
+            self.assertEqual(data.score_id, 1)
+
+    def test_target_practice_hits(self):
+        raw = build_replay(0, b"0|256|-500|0,", mods=8388608,
+                           tail=struct.pack("<d", 2.5))
+        data = ReplayFile.from_bytes(raw)
+        self.assertEqual(data.target_practice_hits, 2.5)
+        self.assertIsNone(ReplayFile.from_bytes(
+            build_replay(0, b"0|256|-500|0,")).target_practice_hits)
+
+    def test_from_bytes(self):
+        with open("tests//test.osr", "rb") as stream:
+            raw = stream.read()
+        first = ReplayFile.from_bytes(raw)
+        second = ReplayFile.from_bytes(raw)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.replay_md5, "a76cffba3f24007d387e18f93f32eb30")
+        self.assertEqual(first.frames, second.frames)
+
+    def test_buffer_not_held(self):
+        with open("tests//test.osr", "rb") as stream:
+            raw = bytearray(stream.read())
+        data = ReplayFile.from_bytes(raw)
+        raw += b"\x00"  # Fails if the replay still exports the buffer.
+        unread = pickle.loads(pickle.dumps(data))
+        self.assertEqual(unread.frames, data.frames)
+
+    def test_pure_lzma(self):
+        raw = lzma.compress(b"0|256|-500|0,16|100.5|200|1,",
+                            format=lzma.FORMAT_ALONE)
+        data = ReplayFile.from_bytes(raw, pure_lzma=True)
+        self.assertEqual(data.frames[1], OsuReplayFrame(16, 100.5, 200.0, 1))
+
+    def test_pure_lzma_file(self):
+        raw = lzma.compress(b"0|256|-500|0,16|100.5|200|1,",
+                            format=lzma.FORMAT_ALONE)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frames.lzma")
+            with open(path, "wb") as stream:
+                stream.write(raw)
+            data = ReplayFile.from_file(path, pure_lzma=True)
+            self.assertEqual(len(data.frames), 2)
+
+            with open(path, "wb") as stream:
+                stream.write(raw[:-5])
+            # Parse error must not be hidden by closing the map.
+            with self.assertRaises(lzma.LZMAError):
+                ReplayFile.from_file(path, pure_lzma=True)
+
+            open(path, "wb").close()
+            with self.assertRaises(lzma.LZMAError):
+                ReplayFile.from_file(path, pure_lzma=True)
+
+    def test_malformed_frames(self):
+        # Incomplete last frame is dropped.
+        raw = lzma.compress(b"0|1|2|3,5|6|7|8", format=lzma.FORMAT_ALONE)
+        data = ReplayFile.from_bytes(raw, pure_lzma=True)
+        self.assertEqual(list(data.frames), [OsuReplayFrame(0, 1.0, 2.0, 3)])
+
+        raw = lzma.compress(b"0|1|2|3|4,5|6|7,", format=lzma.FORMAT_ALONE)
+        with self.assertRaises(ValueError):
+            ReplayFile.from_bytes(raw, pure_lzma=True)
+
+    def test_from_files(self):
+        single = ReplayFile.from_file("tests//test.osr")
+        replays = ReplayFile.from_files(["tests//test.osr"] * 3, workers=2)
+        self.assertEqual(len(replays), 3)
+        for data in replays:
+            self.assertEqual(data.replay_md5, single.replay_md5)
+            self.assertEqual(data.delta, single.delta)
+            self.assertEqual(data.seed, single.seed)
+
 
 if __name__ == '__main__':
     unittest.main()